@@ -1,18 +1,394 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import aiohttp
+from aiolimiter import AsyncLimiter
+import lxml.html
+from selectolax.lexbor import LexborHTMLParser
+from urllib.parse import urljoin, urlparse, urlsplit
+from urllib.robotparser import RobotFileParser
 import os
+import random
 import re
 from pathlib import Path
 import hashlib
-import time
-import html2text
-import json
+import sqlite3
+import orjson
+
+_session = None
+_session_loop = None
+_NOT_MODIFIED = object()  # Page inchangée depuis le dernier crawl (HTTP 304)
+_NOT_HTML = object()  # Ressource qui n'est pas une page HTML (PDF, images...)
+_MAX_RETRIES = 5
+_RETRY_STATUSES = (429, 503)
+_MAX_RETRY_DELAY = 60  # secondes, borne un Retry-After trop long
+_SKIPPED_LINK_PREFIXES = ('#', 'mailto:', 'javascript:', 'tel:')
+_HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+# Pas de durée totale pour les fichiers volumineux, seulement des délais d'inactivité
+_DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30)
+
+# Motifs compilés une seule fois par processus
+_UNWANTED_CLASS_RE = re.compile('|'.join([
+    'menu', 'sidebar', 'nav', 'footer', 'header',
+    'comment', 'advertisement', 'social', 'widget'
+]), re.I)
+_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n')
+_LEVEL_STATE_RE = re.compile(r'urls_level_(\d+)\.json$')
+_WHITESPACE_RE = re.compile(r'\s+')
+_TRAILING_SPACES_RE = re.compile(r'[ \t]+\n')
+_HARD_BREAK = '\0'  # Marque un <br>, remplacé par deux espaces une fois les fins de ligne nettoyées
+
+# Balises ignorées, balises de bloc et titres pour la conversion en Markdown
+_SKIPPED_TAGS = {'head', 'script', 'style', 'noscript', 'template', 'svg'}
+_BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'header', 'footer', 'aside', 'nav',
+    'form', 'fieldset', 'figure', 'figcaption', 'address', 'details', 'summary',
+    'dl', 'dt', 'dd', 'li', 'center'
+}
+_HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+_html_parser = lxml.html.HTMLParser(encoding='utf-8', remove_comments=True, huge_tree=True)
+
+
+def url_hash(url):
+    """Nom de fichier stable pour une URL (SHA-256 accéléré matériellement, tronqué à 32 caractères)"""
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+def _join_link(page_url, origin, href):
+    """URL absolue d'un lien, sans passer par urljoin pour les cas courants
+
+    Retourne None pour les ancres et les liens non HTTP (mailto:, javascript:...).
+    """
+    if href.startswith(('http://', 'https://')):
+        return href
+    # Les segments . et .. sont laissés à urljoin
+    if href.startswith('/') and not href.startswith('//') and '/.' not in href:
+        return origin + href
+    if href.startswith(_SKIPPED_LINK_PREFIXES):
+        return None
+    return urljoin(page_url, href)
+
+
+def _write_text(path, text):
+    """Écrit un fichier texte avec un tampon de 64 Kio"""
+    with open(path, 'w', encoding='utf-8', buffering=1 << 16) as f:
+        f.write(text)
+
+
+def parse_html(html):
+    """Construit l'arbre lxml d'une page (encodé en UTF-8 pour accepter les en-têtes XML)"""
+    return lxml.html.document_fromstring(html.encode('utf-8'), parser=_html_parser)
+
+
+def get_session():
+    """Retourne la session aiohttp partagée (pool de connexions)
+
+    Une session est liée à sa boucle asyncio : elle est recréée pour toute nouvelle boucle.
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session_loop = loop
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, limit_per_host=10, enable_cleanup_closed=True),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+    return _session
+
+
+async def close_session():
+    """Ferme la session aiohttp partagée"""
+    global _session, _session_loop
+    if _session is not None and not _session.closed and _session_loop is asyncio.get_running_loop():
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+def _retry_delay(response, attempt):
+    """Attente avant une nouvelle tentative : Retry-After, sinon backoff exponentiel"""
+    try:
+        delay = int(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        delay = 2 ** attempt
+    return min(max(delay, 0), _MAX_RETRY_DELAY) + random.random()
+
+
+async def _request(url, sem, limiter, handle, headers=None, timeout=None):
+    """Requête GET limitée en concurrence et en débit ; handle(réponse) lit le corps
+
+    Les réponses 429 / 503 sont retentées jusqu'à _MAX_RETRIES fois, puis levées
+    comme une erreur (aiohttp.ClientResponseError). timeout remplace celui de la session.
+    """
+    options = {'timeout': timeout} if timeout else {}
+    for attempt in range(_MAX_RETRIES + 1):
+        # Le créneau du sémaphore est libéré pendant l'attente entre deux tentatives
+        async with sem, limiter:
+            async with get_session().get(url, headers=headers, **options) as r:
+                if r.status not in _RETRY_STATUSES:
+                    return await handle(r)
+                if attempt == _MAX_RETRIES:
+                    r.raise_for_status()
+                delay = _retry_delay(r, attempt)
+                status = r.status
+        print(f"Nouvelle tentative pour {url} dans {delay:.0f} s (HTTP {status})")
+        await asyncio.sleep(delay)
+
+
+async def _read_html(r):
+    """Retourne (statut, en-têtes, html) ; html vaut None si la ressource n'est pas
+    une page HTML (PDF, images...) ou n'a pas changé (304)
+
+    Une réponse sans en-tête Content-Type est traitée comme du HTML.
+    """
+    html = None
+    if 'Content-Type' not in r.headers or r.content_type in _HTML_CONTENT_TYPES:
+        # Charset de l'en-tête Content-Type, sans détection sur le corps
+        try:
+            html = await r.text(encoding=r.charset or 'utf-8', errors='replace')
+        except LookupError:
+            # Charset inconnu de Python : repli sur utf-8
+            html = await r.text(encoding='utf-8', errors='replace')
+    return r.status, r.headers, html
+
+
+async def _fetch(url, sem, limiter, headers=None):
+    """Télécharge le HTML d'une page (voir _request et _read_html)"""
+    return await _request(url, sem, limiter, _read_html, headers)
+
+
+class MarkdownWriter:
+    """Convertit un arbre lxml en Markdown en un seul parcours, sans re-sérialiser le HTML
+
+    Les liens et images présents dans local_links sont réécrits vers leur copie locale.
+    """
+
+    def __init__(self, local_links=None):
+        self.local_links = local_links or {}
+        self.out = []
+
+    def render(self, element):
+        """Retourne le Markdown d'un élément et de ses descendants"""
+        self._emit(element, 0)
+        markdown = _TRAILING_SPACES_RE.sub('\n', ''.join(self.out)).replace(_HARD_BREAK, '  ')
+        return _BLANK_LINES_RE.sub('\n\n', markdown)
+
+    def _write(self, chunk):
+        self.out.append(chunk)
+
+    def _text(self, text):
+        text = _WHITESPACE_RE.sub(' ', text)
+        # Pas d'espace en début de ligne ni d'espaces doublés
+        if not self.out or self.out[-1][-1:].isspace():
+            text = text.lstrip()
+        if text:
+            self._write(text)
+
+    def _block_break(self):
+        if self.out:
+            self._write('\n\n')
+
+    def _newline(self):
+        if self.out and not self.out[-1].endswith('\n'):
+            self._write('\n')
+
+    def _inline(self, element, depth=0):
+        """Rend le contenu d'un élément sur une seule ligne"""
+        saved, self.out = self.out, []
+        self._emit_children(element, depth)
+        text, self.out = ''.join(self.out), saved
+        return _WHITESPACE_RE.sub(' ', text.replace(_HARD_BREAK, '')).strip()
+
+    def _emit_children(self, element, depth):
+        if element.text:
+            self._text(element.text)
+        for child in element:
+            self._emit(child, depth)
+            if child.tail:
+                self._text(child.tail)
+
+    def _emit(self, element, depth):
+        tag = element.tag
+        if not isinstance(tag, str) or tag in _SKIPPED_TAGS:
+            return
+
+        if tag in _HEADING_TAGS:
+            text = self._inline(element, depth)
+            if text:
+                self._block_break()
+                self._write(f"{'#' * int(tag[1])} {text}\n\n")
+        elif tag == 'br':
+            self._write(_HARD_BREAK + '\n')
+        elif tag == 'hr':
+            self._block_break()
+            self._write('* * *\n\n')
+        elif tag in ('strong', 'b'):
+            self._wrap(element, depth, '**')
+        elif tag in ('em', 'i'):
+            self._wrap(element, depth, '_')
+        elif tag == 'code':
+            text = element.text_content()
+            if text:
+                self._write(f'`{text}`')
+        elif tag == 'a':
+            self._link(element, depth)
+        elif tag == 'img':
+            src = element.get('src')
+            if src:
+                src = self.local_links.get(src, src)
+                self._write(f"![{element.get('alt') or ''}]({src})")
+        elif tag in ('ul', 'ol'):
+            self._list(element, depth)
+        elif tag == 'pre':
+            code = element.text_content().strip('\n')
+            if code:
+                self._block_break()
+                self._write('\n'.join('    ' + line for line in code.split('\n')) + '\n\n')
+        elif tag == 'blockquote':
+            text = self._block(element, depth)
+            if text:
+                self._block_break()
+                self._write('\n'.join('> ' + line if line else '>' for line in text.split('\n')) + '\n\n')
+        elif tag == 'table':
+            self._table(element, depth)
+        elif tag in _BLOCK_TAGS:
+            self._block_break()
+            self._emit_children(element, depth)
+            self._block_break()
+        else:
+            self._emit_children(element, depth)
+
+    def _write_inline(self, element, markdown):
+        """Écrit un élément en ligne en gardant un espace à l'extérieur de ses bords"""
+        raw = element.text_content()
+        if raw[:1].isspace() and self.out and not self.out[-1][-1:].isspace():
+            markdown = ' ' + markdown
+        if raw[-1:].isspace():
+            markdown += ' '
+        self._write(markdown)
+
+    def _wrap(self, element, depth, marker):
+        text = self._inline(element, depth)
+        if text:
+            self._write_inline(element, f'{marker}{text}{marker}')
+
+    def _link(self, element, depth):
+        text = self._inline(element, depth)
+        href = element.get('href')
+        if href:
+            href = self.local_links.get(href, href)
+        if href and not href.startswith('#'):
+            self._write_inline(element, f'[{text}](<{href}>)')
+        elif text:
+            self._write_inline(element, text)
+
+    def _block(self, element, depth):
+        """Rend le contenu d'un élément en Markdown multi-lignes"""
+        saved, self.out = self.out, []
+        self._emit_children(element, depth)
+        text, self.out = ''.join(self.out), saved
+        return _BLANK_LINES_RE.sub('\n\n', _TRAILING_SPACES_RE.sub('\n', text)).strip()
+
+    def _list(self, element, depth):
+        if depth == 0:
+            self._block_break()
+        else:
+            self._newline()
+        for number, item in enumerate(element.iterchildren('li'), 1):
+            # Les listes de premier niveau sont décalées de deux espaces, les sous-listes
+            # sont alignées sur le texte de l'élément parent
+            bullet = ('  ' if depth == 0 else '') + (f'{number}. ' if element.tag == 'ol' else '* ')
+            lines = self._block(item, depth + 1).split('\n')
+            # Les lignes suivantes de l'élément (paragraphes, code, sous-listes) sont
+            # indentées sous le texte de la puce
+            indent = ' ' * len(bullet)
+            self._newline()
+            self._write(bullet + '\n'.join([lines[0]] + [indent + line if line else line for line in lines[1:]]) + '\n')
+        if depth == 0:
+            self._write('\n')
+
+    def _table(self, element, depth):
+        lines = []
+        for row in element.iter('tr'):
+            cells = [
+                self._inline(cell, depth).replace('|', '\\|')
+                for cell in row if cell.tag in ('th', 'td')
+            ]
+            if not cells:
+                continue
+            lines.append(' | '.join(cells))
+            if len(lines) == 1:
+                lines.append(' | '.join(['---'] * len(cells)))
+        if lines:
+            self._block_break()
+            self._write('\n'.join(lines) + '\n\n')
+
+
+class HttpCache:
+    """Cache persistant (SQLite) des validateurs HTTP ETag / Last-Modified par URL"""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS validators (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT)'
+        )
+
+    def conditional_headers(self, url):
+        """Retourne les en-têtes If-None-Match / If-Modified-Since connus pour une URL"""
+        row = self.conn.execute(
+            'SELECT etag, last_modified FROM validators WHERE url = ?', (url,)
+        ).fetchone()
+        headers = {}
+        if row:
+            if row[0]:
+                headers['If-None-Match'] = row[0]
+            if row[1]:
+                headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def store(self, url, headers):
+        """Enregistre les validateurs d'une réponse (ou les oublie s'il n'y en a plus)"""
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag or last_modified:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO validators VALUES (?, ?, ?)', (url, etag, last_modified)
+            )
+        else:
+            self.conn.execute('DELETE FROM validators WHERE url = ?', (url,))
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+_worker_crawler = None
+
+
+def _init_worker(base_url, output_dir, robots):
+    """Initialise le crawler propre à chaque processus de traitement"""
+    global _worker_crawler
+    _worker_crawler = WebCrawler(base_url, output_dir)
+    _worker_crawler.robots = robots
+
+
+def process_html(url, html):
+    """Convertit une page dans un processus de traitement (voir WebCrawler.render_page)"""
+    return _worker_crawler.render_page(url, html)
+
 
 class WebCrawler:
-    def __init__(self, base_url, output_dir="output"):
+    def __init__(self, base_url, output_dir="output", requests_per_second=20):
         self.base_url = base_url
         self.domain = urlparse(base_url).netloc
+        self.requests_per_second = requests_per_second
+        self.robots = None  # Règles du robots.txt, chargées au premier crawl
+        # Schéma http(s), sous-domaines éventuels, port éventuel (sauf si l'URL de départ
+        # en précise un), puis fin de l'hôte
+        port = '' if ':' in self.domain else r'(?::\d+)?'
+        self._domain_re = re.compile(
+            r'https?://(?:[^/?#@]*\.)?' + re.escape(self.domain) + port + r'(?:[/?#]|$)', re.I
+        )
         self.urls_by_level = {}  # Pour stocker les URLs par niveau
         self.all_urls = set()    # Pour stocker toutes les URLs
         self.visited_urls = set() # Pour le tracking pendant le crawling
@@ -29,36 +405,96 @@ class WebCrawler:
             'csv': ['.csv'],
             'text': ['.txt']
         }
-        
-        self.html_converter = html2text.HTML2Text()
-        self.setup_html_converter()
+        # Table inverse extension -> sous-dossier pour une recherche en O(1)
+        self._ext_to_folder = {
+            ext: file_type for file_type, extensions in self.file_types.items() for ext in extensions
+        }
 
         # Créer le dossier pour sauvegarder l'état des URLs
         self.urls_dir = os.path.join(output_dir, "urls")
         if not os.path.exists(self.urls_dir):
             os.makedirs(self.urls_dir)
 
-    def save_urls_state(self):
-        """Sauvegarde l'état actuel des URLs dans un fichier JSON"""
-        state = {
-            'urls_by_level': {str(k): list(v) for k, v in self.urls_by_level.items()},
-            'all_urls': list(self.all_urls)
-        }
-        with open(os.path.join(self.urls_dir, 'urls_state.json'), 'w') as f:
-            json.dump(state, f, indent=2)
+    def save_urls_state(self, level=None):
+        """Sauvegarde l'état des URLs, un fichier JSON par niveau
+
+        Seul le niveau indiqué est réécrit, ce qui rend la sauvegarde proportionnelle
+        aux nouvelles URLs ; sans niveau, tous les niveaux sont sauvegardés. Les fichiers
+        des niveaux absents de urls_by_level sont supprimés.
+        """
+        levels = [level] if level is not None else list(self.urls_by_level)
+        for lvl in levels:
+            Path(self.urls_dir, f'urls_level_{lvl}.json').write_bytes(
+                orjson.dumps(list(self.urls_by_level[lvl]))
+            )
+
+        # Supprimer les niveaux d'un crawl précédent qui ne font plus partie de l'état
+        for file_name in os.listdir(self.urls_dir):
+            match = _LEVEL_STATE_RE.match(file_name)
+            if match and int(match.group(1)) not in self.urls_by_level:
+                os.remove(os.path.join(self.urls_dir, file_name))
 
     def load_urls_state(self):
-        """Charge l'état des URLs depuis le fichier JSON"""
+        """Charge l'état des URLs depuis les fichiers JSON de chaque niveau"""
+        level_files = {}
+        for file_name in os.listdir(self.urls_dir):
+            match = _LEVEL_STATE_RE.match(file_name)
+            if match:
+                level_files[int(match.group(1))] = os.path.join(self.urls_dir, file_name)
+
+        if not level_files:
+            return self._load_legacy_urls_state()
+
+        self.urls_by_level = {}
+        for level, path in level_files.items():
+            self.urls_by_level[level] = set(orjson.loads(Path(path).read_bytes()))
+        # Toute URL connue a été découverte à un niveau donné
+        self.all_urls = set().union(*self.urls_by_level.values())
+        return True
+
+    def _load_legacy_urls_state(self):
+        """Charge l'ancien fichier d'état unique urls_state.json"""
         try:
-            with open(os.path.join(self.urls_dir, 'urls_state.json'), 'r') as f:
-                state = json.load(f)
-                self.urls_by_level = {int(k): set(v) for k, v in state['urls_by_level'].items()}
-                self.all_urls = set(state['all_urls'])
-                return True
+            state = orjson.loads(Path(self.urls_dir, 'urls_state.json').read_bytes())
+            self.urls_by_level = {int(k): set(v) for k, v in state['urls_by_level'].items()}
+            self.all_urls = set(state['all_urls'])
+            return True
         except FileNotFoundError:
             return False
 
-    def extract_urls_level(self, level):
+    async def load_robots(self):
+        """Charge le robots.txt du domaine (tout est autorisé s'il est absent)"""
+        robots_url = f"{urlparse(self.base_url).scheme}://{self.domain}/robots.txt"
+        self.robots = RobotFileParser(robots_url)
+        try:
+            async with get_session().get(robots_url) as r:
+                status = r.status
+                text = await r.text(errors='replace')
+        except Exception as e:
+            print(f"Erreur lors du chargement de {robots_url}: {e}")
+            self.robots.allow_all = True
+            return
+
+        # Mêmes règles que RobotFileParser.read()
+        if status in (401, 403):
+            self.robots.disallow_all = True
+        elif status >= 400:
+            self.robots.allow_all = True
+        else:
+            self.robots.parse(text.splitlines())
+
+    def can_fetch(self, url):
+        """Vérifie que le robots.txt autorise l'URL"""
+        return self.robots is None or self.robots.can_fetch('*', url)
+
+    def make_limiter(self):
+        """Limiteur de débit : Crawl-delay du robots.txt s'il existe, sinon requests_per_second"""
+        crawl_delay = self.robots.crawl_delay('*') if self.robots is not None else None
+        if crawl_delay:
+            return AsyncLimiter(1, float(crawl_delay))
+        return AsyncLimiter(self.requests_per_second, 1)
+
+    async def extract_urls_level(self, level):
         """Extrait les URLs pour un niveau spécifique"""
         if level == 1:
             # Pour le niveau 1, on part de l'URL de base
@@ -73,28 +509,45 @@ class WebCrawler:
         self.urls_by_level[level] = set()
         
         print(f"\nExtraction des URLs de niveau {level}...")
-        for url in current_urls:
+        current_urls = list(current_urls)
+        sem = asyncio.Semaphore(20)
+        try:
+            if self.robots is None:
+                await self.load_robots()
+            limiter = self.make_limiter()
+            pages = await asyncio.gather(
+                *[_fetch(u, sem, limiter) for u in current_urls],
+                return_exceptions=True
+            )
+        finally:
+            await close_session()
+
+        for url, page in zip(current_urls, pages):
             try:
                 print(f"Extraction depuis: {url}")
-                response = requests.get(url)
-                soup = BeautifulSoup(response.text, 'html.parser')
+                if isinstance(page, Exception):
+                    raise page
+                _, response_headers, html = page
+                if html is None:
+                    print(f"Ignorée : contenu non HTML ({response_headers.get('Content-Type')})")
+                    continue
+                tree = LexborHTMLParser(html)
                 
-                # Trouver tous les liens
-                for link in soup.find_all('a'):
-                    href = link.get('href')
-                    if href:
-                        full_url = urljoin(url, href)
-                        if self.is_valid_url(full_url) and full_url not in self.all_urls:
-                            self.urls_by_level[level].add(full_url)
-                            self.all_urls.add(full_url)
-                
-                time.sleep(0.1)  # Petit délai pour ne pas surcharger le serveur
+                # Trouver tous les liens, puis filtrer et dédupliquer en opérations groupées
+                hrefs = [link.attributes.get('href') for link in tree.css('a[href]')]
+                parts = urlsplit(url)
+                origin = f"{parts.scheme}://{parts.netloc}"
+                full_urls = [_join_link(url, origin, href) for href in hrefs if href]
+                new_urls = {u for u in full_urls if u and self._domain_re.match(u)} - self.all_urls
+                new_urls = {u for u in new_urls if self.can_fetch(u)}
+                self.urls_by_level[level] |= new_urls
+                self.all_urls |= new_urls
                 
             except Exception as e:
                 print(f"Erreur lors de l'extraction des URLs de {url}: {e}")
 
         print(f"\nNiveau {level} terminé. {len(self.urls_by_level[level])} nouvelles URLs trouvées.")
-        self.save_urls_state()
+        self.save_urls_state(level)
         return True
 
     def show_urls_stats(self):
@@ -127,144 +580,236 @@ class WebCrawler:
             if not os.path.exists(folder_path):
                 os.makedirs(folder_path)
 
-    def setup_html_converter(self):
-        """Configure les options de conversion HTML vers Markdown"""
-        self.html_converter.ignore_links = False
-        self.html_converter.ignore_images = False
-        self.html_converter.ignore_emphasis = False
-        self.html_converter.ignore_tables = False
-        self.html_converter.body_width = 0
-        self.html_converter.protect_links = True
-        self.html_converter.unicode_snob = True
-        self.html_converter.images_to_alt = False
-        self.html_converter.default_image_alt = ""
-
     def is_valid_url(self, url):
-        """Vérifie si l'URL appartient au même domaine"""
-        return self.domain in url
+        """Vérifie si l'URL appartient au même domaine (ou à un sous-domaine)"""
+        return self._domain_re.match(url) is not None
 
     def get_file_type_folder(self, extension):
         """Détermine le sous-dossier approprié pour un type de fichier donné"""
-        extension = extension.lower()
-        for file_type, extensions in self.file_types.items():
-            if extension in extensions:
-                return file_type
-        return None
+        return self._ext_to_folder.get(extension.lower())
+
+    def local_file_path(self, url):
+        """Chemin local d'un fichier téléchargeable (déterministe), None pour les autres URLs"""
+        extension = os.path.splitext(url)[1].lower()
+        file_type = self.get_file_type_folder(extension)
+        if not file_type:
+            return None
+        return os.path.join(self.files_dir, file_type, url_hash(url) + extension)
 
-    def download_file(self, url):
+    async def download_file(self, url, sem, limiter):
         """Télécharge les fichiers et les place dans les sous-dossiers appropriés"""
+        file_path = None
         try:
-            response = requests.get(url, stream=True)
-            if response.status_code == 200:
-                extension = os.path.splitext(url)[1].lower()
-                file_type = self.get_file_type_folder(extension)
-                
-                if file_type:
-                    file_name = hashlib.md5(url.encode()).hexdigest() + extension
-                    file_path = os.path.join(self.files_dir, file_type, file_name)
-                    
+            file_path = self.local_file_path(url)
+            if file_path and self.can_fetch(url):
+                async def save(response):
+                    if response.status != 200:
+                        return None
+                    # Écriture par blocs sans charger tout le fichier en mémoire
                     with open(file_path, 'wb') as f:
-                        f.write(response.content)
-                    
+                        async for chunk in response.content.iter_chunked(1 << 16):
+                            f.write(chunk)
                     return os.path.relpath(file_path, self.content_dir)
-                    
+
+                saved = await _request(url, sem, limiter, save, timeout=_DOWNLOAD_TIMEOUT)
+                if saved is None:
+                    Path(file_path).unlink(missing_ok=True)
+                return saved
+
         except Exception as e:
             print(f"Erreur lors du téléchargement du fichier {url}: {e}")
+            # Pas de fichier tronqué laissé sur le disque
+            if file_path:
+                Path(file_path).unlink(missing_ok=True)
         return None
 
-    def clean_content(self, soup):
+    def clean_content(self, root):
         """Nettoie le contenu HTML"""
         unwanted_elements = [
             'script', 'style', 'nav', 'header', 'footer', 
             'iframe', 'meta', 'noscript', 'aside', 'form'
         ]
-        for element in soup.find_all(unwanted_elements):
-            element.decompose()
+        for element in list(root.iter(*unwanted_elements)):
+            if element.getparent() is not None:
+                element.drop_tree()
         
-        unwanted_classes = [
-            'menu', 'sidebar', 'nav', 'footer', 'header', 
-            'comment', 'advertisement', 'social', 'widget'
-        ]
-        for class_name in unwanted_classes:
-            for element in soup.find_all(class_=re.compile(class_name, re.I)):
-                element.decompose()
+        for element in root.xpath('//*[@class]'):
+            if _UNWANTED_CLASS_RE.search(element.get('class')) and element.getparent() is not None:
+                element.drop_tree()
         
-        main_content = (
-            soup.find('main') or 
-            soup.find('article') or 
-            soup.find('div', class_='content') or
-            soup.find('div', class_='post-content')
-        )
-        return main_content if main_content else soup.find('body')
+        # Un seul parcours : on garde le premier candidat de plus haute priorité
+        # (main, puis article, puis div.content, puis div.post-content)
+        main_content = None
+        best_rank = 4
+        for element in root.iter('main', 'article', 'div'):
+            if element.tag == 'main':
+                rank = 0
+            elif element.tag == 'article':
+                rank = 1
+            else:
+                classes = (element.get('class') or '').split()
+                if 'content' in classes:
+                    rank = 2
+                elif 'post-content' in classes:
+                    rank = 3
+                else:
+                    continue
+            if rank < best_rank:
+                main_content, best_rank = element, rank
+                if rank == 0:
+                    break
+        return main_content if main_content is not None else root.find('body')
 
     def process_content(self, content, base_url):
-        """Traite le contenu HTML et le convertit en Markdown"""
-        if not content:
-            return ""
-
-        for link in content.find_all('a'):
-            href = link.get('href')
-            if href:
-                full_url = urljoin(base_url, href)
-                extension = os.path.splitext(full_url)[1].lower()
-                if extension and self.get_file_type_folder(extension):
-                    file_path = self.download_file(full_url)
-                    if file_path:
-                        link['href'] = file_path
-
-        for img in content.find_all('img'):
-            src = img.get('src')
-            if src:
-                full_url = urljoin(base_url, src)
-                extension = os.path.splitext(full_url)[1].lower()
-                if extension in self.file_types['images']:
-                    file_path = self.download_file(full_url)
-                    if file_path:
-                        img['src'] = file_path
-
-        markdown_content = self.html_converter.handle(str(content))
-        markdown_content = re.sub(r'\n\s*\n\s*\n', '\n\n', markdown_content)
-        return markdown_content.strip()
-
-    def crawl_all_urls(self):
-        """Crawle toutes les URLs collectées"""
+        """Traite le contenu HTML et le convertit en Markdown
+
+        Les liens vers des fichiers autorisés par le robots.txt sont réécrits vers leur
+        futur emplacement local pendant l'unique parcours de conversion ; rien n'est
+        téléchargé ici. Retourne
+        (markdown, {URL du fichier: chemin local relatif}).
+        """
+        if content is None:
+            return "", {}
+
+        # Liens et images à télécharger : valeur brute de l'attribut -> chemin local
+        local_links = {}
+        file_links = {}
+        for element in content.iter('a', 'img'):
+            link = element.get('href' if element.tag == 'a' else 'src')
+            if link and link not in local_links:
+                full_url = urljoin(base_url, link)
+                file_type = self.get_file_type_folder(os.path.splitext(full_url)[1])
+                if (file_type and (element.tag == 'a' or file_type == 'images')
+                        and self.can_fetch(full_url)):
+                    file_path = os.path.relpath(self.local_file_path(full_url), self.content_dir)
+                    local_links[link] = file_links[full_url] = file_path
+
+        markdown_content = MarkdownWriter(local_links).render(content)
+        return markdown_content.strip(), file_links
+
+    def render_page(self, url, html):
+        """Convertit le HTML d'une page en (nom de fichier, contenu Markdown, fichiers liés)
+
+        Retourne None si la page n'a pas de contenu principal.
+        """
+        root = parse_html(html)
+        main_content = self.clean_content(root)
+        if main_content is None:
+            return None
+
+        title = root.findtext('.//title')
+        markdown_content, file_links = self.process_content(main_content, url)
+        header = f"# {title.strip()}\n\n" if title and title.strip() else ""
+        text = f"{header}Source: {url}\n\n---\n\n{markdown_content}"
+        return url_hash(url) + '.txt', text, file_links
+
+    async def _crawl_page(self, url, sem, limiter, executor, http_cache, downloads):
+        """Télécharge une page, la fait convertir par un processus de traitement puis
+        télécharge les fichiers liés
+
+        Retourne (url, page, en-têtes) ; une page déjà exportée et inchangée côté
+        serveur (304) n'est ni re-téléchargée ni re-convertie.
+        """
+        try:
+            headers = None
+            if os.path.exists(os.path.join(self.content_dir, url_hash(url) + '.txt')):
+                headers = http_cache.conditional_headers(url)
+            status, response_headers, html = await _fetch(url, sem, limiter, headers=headers)
+            if status == 304:
+                return url, _NOT_MODIFIED, None
+            if html is None:
+                return url, _NOT_HTML, response_headers
+            if not html:
+                return url, None, None
+            loop = asyncio.get_running_loop()
+            page = await loop.run_in_executor(executor, process_html, url, html)
+            if page is None:
+                return url, None, None
+
+            file_name, text, file_links = page
+            # Chaque fichier n'est téléchargé qu'une fois, même s'il est lié par plusieurs pages
+            for file_url in file_links:
+                if file_url not in downloads:
+                    downloads[file_url] = asyncio.ensure_future(
+                        self.download_file(file_url, sem, limiter)
+                    )
+            paths = await asyncio.gather(*[downloads[file_url] for file_url in file_links])
+            # Un fichier non téléchargé garde son lien distant
+            for (file_url, local_path), path in zip(file_links.items(), paths):
+                if not path:
+                    text = text.replace(f"](<{local_path}>)", f"](<{file_url}>)")
+                    text = text.replace(f"]({local_path})", f"]({file_url})")
+            return url, (file_name, text), response_headers
+        except Exception as e:
+            return url, e, None
+
+    async def crawl_all_urls(self):
+        """Crawle toutes les URLs collectées
+
+        La conversion utilise des processus lancés en mode spawn : le script appelant
+        doit protéger son point d'entrée par if __name__ == '__main__'.
+        """
         if not self.all_urls:
             print("Aucune URL à crawler. Exécutez d'abord l'extraction des URLs.")
             return
 
         self.create_directories()
-        total_urls = len(self.all_urls)
+        if self.robots is None:
+            await self.load_robots()
+        pending_urls = [
+            url for url in self.all_urls
+            if url not in self.visited_urls and self.can_fetch(url)
+        ]
+        total_urls = len(pending_urls)
         processed = 0
 
         print(f"\nDémarrage du crawling de {total_urls} pages...")
-        
-        for url in self.all_urls:
-            processed += 1
-            print(f"\nTraitement de la page {processed}/{total_urls}")
-            print(f"Crawling: {url}")
-            
-            try:
-                if url not in self.visited_urls:
-                    response = requests.get(url)
-                    soup = BeautifulSoup(response.text, 'html.parser')
+
+        # Téléchargements concurrents dans la boucle asyncio, conversion HTML -> Markdown
+        # répartie sur tous les cœurs, écriture des fichiers dans le processus principal
+        sem = asyncio.Semaphore(20)
+        limiter = self.make_limiter()
+        loop = asyncio.get_running_loop()
+        downloads = {}
+        http_cache = HttpCache(os.path.join(self.urls_dir, 'http_cache.sqlite'))
+        try:
+            with ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.base_url, self.output_dir, self.robots)
+            ) as executor:
+                tasks = [self._crawl_page(u, sem, limiter, executor, http_cache, downloads) for u in pending_urls]
+                for next_page in asyncio.as_completed(tasks):
+                    url, page, response_headers = await next_page
+                    processed += 1
+                    print(f"\nTraitement de la page {processed}/{total_urls}")
+                    print(f"Crawling: {url}")
                     
-                    main_content = self.clean_content(soup)
-                    if main_content:
-                        markdown_content = self.process_content(main_content, url)
+                    try:
+                        if isinstance(page, Exception):
+                            raise page
+                        if page is _NOT_HTML:
+                            # Ni fichier ni entrée dans le sitemap
+                            print(f"Ignorée : contenu non HTML ({response_headers.get('Content-Type')})")
+                            continue
+                        if page is _NOT_MODIFIED:
+                            print("Page inchangée (304), fichier existant conservé")
+                        elif page:
+                            # Écriture dans un thread : la boucle continue les téléchargements
+                            file_name, text = page
+                            await loop.run_in_executor(
+                                None, _write_text, os.path.join(self.content_dir, file_name), text
+                            )
+                            http_cache.store(url, response_headers)
                         
-                        file_name = hashlib.md5(url.encode()).hexdigest() + '.txt'
-                        with open(os.path.join(self.content_dir, file_name), 'w', encoding='utf-8') as f:
-                            if soup.title and soup.title.string and soup.title.string.strip():
-                                f.write(f"# {soup.title.string.strip()}\n\n")
-                            f.write(f"Source: {url}\n\n")
-                            f.write("---\n\n")
-                            f.write(markdown_content)
-                    
-                    self.visited_urls.add(url)
-                    time.sleep(1)  # Respecter le site
-                    
-            except Exception as e:
-                print(f"Erreur lors du crawling de {url}: {e}")
+                        self.visited_urls.add(url)
+                        
+                    except Exception as e:
+                        print(f"Erreur lors du crawling de {url}: {e}")
+        finally:
+            http_cache.close()
+            await close_session()
 
         # Créer le sitemap
         with open(os.path.join(self.output_dir, 'sitemap.txt'), 'w', encoding='utf-8') as f:
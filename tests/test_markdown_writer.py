@@ -0,0 +1,60 @@
+from crawler import MarkdownWriter, parse_html
+
+
+def to_markdown(body, local_links=None):
+    root = parse_html(f"<html><body><main>{body}</main></body></html>")
+    return MarkdownWriter(local_links).render(root.find('.//main')).strip()
+
+
+def test_link_keeps_space_at_its_edges():
+    assert to_markdown('<p>Read <a href="/x">the docs </a>today</p>') == 'Read [the docs](</x>) today'
+    assert to_markdown('<p>Read<a href="/x"> the docs</a></p>') == 'Read [the docs](</x>)'
+
+
+def test_emphasis_keeps_space_at_its_edges():
+    assert to_markdown('<p>I <em>really </em>enjoy it</p>') == 'I _really_ enjoy it'
+    assert to_markdown('<p>A<strong> bold</strong> move</p>') == 'A **bold** move'
+
+
+def test_no_space_added_between_adjacent_inline_elements():
+    assert to_markdown('<p>un<em>deux</em>trois</p>') == 'un_deux_trois'
+
+
+def test_br_is_a_hard_line_break():
+    assert to_markdown('<p>ligne 1<br>ligne 2</p>') == 'ligne 1  \nligne 2'
+
+
+def test_br_inside_link_text_becomes_a_space():
+    assert to_markdown('<p><a href="/x">a<br>b</a></p>') == '[a b](</x>)'
+
+
+def test_headings_and_lists():
+    html = '<h2>Titre</h2><ul><li>Un</li><li><p>Deux</p></li></ul><ol><li>a</li></ol>'
+    assert to_markdown(html) == '## Titre\n\n  * Un\n  * Deux\n\n  1. a'
+
+
+def test_table():
+    html = '<table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td>x|y</td></tr></table>'
+    assert to_markdown(html) == 'A | B\n--- | ---\n1 | x\\|y'
+
+
+def test_local_links_are_rewritten():
+    html = '<p><a href="doc.pdf">PDF</a> <img src="logo.png" alt="logo"></p>'
+    local_links = {'doc.pdf': '../files/pdf/d.pdf', 'logo.png': '../files/images/l.png'}
+    assert to_markdown(html, local_links) == '[PDF](<../files/pdf/d.pdf>) ![logo](../files/images/l.png)'
+
+
+def test_fragment_links_keep_only_their_text():
+    assert to_markdown('<p>Go <a href="#top">top</a></p>') == 'Go top'
+
+
+def test_list_item_blocks_stay_indented():
+    html = '<ol><li><p>p1</p><p>p2</p></li><li>n</li></ol>'
+    assert to_markdown(html) == '1. p1\n\n     p2\n  2. n'
+    html = '<ul><li>code<pre>a = 1\nb = 2</pre></li><li>n</li></ul>'
+    assert to_markdown(html) == '* code\n\n        a = 1\n        b = 2\n  * n'
+
+
+def test_nested_list_is_aligned_on_parent_text():
+    html = '<ul><li>Un<ul><li>a<br>b</li><li>c</li></ul></li><li>Deux</li></ul>'
+    assert to_markdown(html) == '* Un\n    * a  \n      b\n    * c\n  * Deux'
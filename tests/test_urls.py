@@ -0,0 +1,45 @@
+import pytest
+
+from crawler import WebCrawler, _join_link
+
+PAGE = 'https://example.com/docs/guide/page.html'
+ORIGIN = 'https://example.com'
+
+
+@pytest.mark.parametrize('href, expected', [
+    ('https://other.org/a', 'https://other.org/a'),
+    ('/a/b', 'https://example.com/a/b'),
+    ('/a/../b', 'https://example.com/b'),
+    ('/./a', 'https://example.com/a'),
+    ('//cdn.example.com/x.js', 'https://cdn.example.com/x.js'),
+    ('?q=1', 'https://example.com/docs/guide/page.html?q=1'),
+    ('../intro.html', 'https://example.com/docs/intro.html'),
+    ('next.html', 'https://example.com/docs/guide/next.html'),
+    ('#section', None),
+    ('mailto:someone@example.com', None),
+    ('javascript:void(0)', None),
+])
+def test_join_link(href, expected):
+    assert _join_link(PAGE, ORIGIN, href) == expected
+
+
+@pytest.mark.parametrize('url, valid', [
+    ('https://example.com/a', True),
+    ('https://EXAMPLE.com', True),
+    ('https://docs.example.com/a', True),
+    ('https://example.com:8443/a', True),
+    ('https://evil.com/?x=example.com', False),
+    ('https://example.com.evil.com/a', False),
+    ('https://notexample.com/a', False),
+    ('https://example.com@evil.com/a', False),
+    ('https://example.com:80@evil.com/a', False),
+    ('ftp://example.com/a', False),
+])
+def test_is_valid_url(url, valid):
+    assert WebCrawler('https://example.com/').is_valid_url(url) is valid
+
+
+def test_is_valid_url_keeps_the_start_url_port():
+    crawler = WebCrawler('http://localhost:8080/')
+    assert crawler.is_valid_url('http://localhost:8080/a')
+    assert not crawler.is_valid_url('http://localhost:9090/a')